@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: list-of-dict history vs ConversationHistory.
+
+Builds the same conversations for many sessions in both representations
+and reports traced memory for each, for two paths:
+
+- logged: messages added by log_conversation (generated ISO timestamps)
+- rebuilt: messages rebuilt from PS-2 conversationHistory (epoch-ms timestamps)
+
+Usage:
+    python benchmark_history.py [sessions] [messages_per_session]
+"""
+
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from conversation_history import ConversationHistory
+
+SCAMMER_TEXT = "URGENT: Your account {0} will be blocked today. Send Rs 500 fee to verify{0}@upi immediately."
+AGENT_TEXT = "I'm ready to pay but nervous... can you please give me the UPI ID again? ({0})"
+
+
+def conversation_payload(session: int, messages: int):
+    """Build a PS-2 conversationHistory list as parsed from request JSON"""
+    base_ms = int(time.time() * 1000)
+    payload = []
+    for m in range(messages):
+        sender = "scammer" if m % 2 == 0 else "user"
+        text = (SCAMMER_TEXT if sender == "scammer" else AGENT_TEXT).format(session * messages + m)
+        payload.append({"sender": sender, "text": text, "timestamp": base_ms + m * 1000})
+    return payload
+
+
+def build_dict_sessions(sessions: int, messages: int):
+    data = {}
+    for s in range(sessions):
+        history = []
+        for m in range(messages):
+            role = "scammer" if m % 2 == 0 else "agent"
+            text = (SCAMMER_TEXT if role == "scammer" else AGENT_TEXT).format(s * messages + m)
+            history.append({
+                "role": role,
+                "message": text,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        data[s] = history
+    return data
+
+
+def build_compact_sessions(sessions: int, messages: int):
+    data = {}
+    for s in range(sessions):
+        history = ConversationHistory()
+        for m in range(messages):
+            role = "scammer" if m % 2 == 0 else "agent"
+            text = (SCAMMER_TEXT if role == "scammer" else AGENT_TEXT).format(s * messages + m)
+            history.add(role, text)
+        data[s] = history
+    return data
+
+
+def build_rebuilt_dict_sessions(sessions: int, messages: int):
+    data = {}
+    for s in range(sessions):
+        history = []
+        for hist_msg in conversation_payload(s, messages):
+            role = "scammer" if hist_msg["sender"] == "scammer" else "agent"
+            history.append({
+                "role": role,
+                "message": hist_msg["text"],
+                "timestamp": str(hist_msg["timestamp"])
+            })
+        data[s] = history
+    return data
+
+
+def build_rebuilt_compact_sessions(sessions: int, messages: int):
+    data = {}
+    for s in range(sessions):
+        history = ConversationHistory()
+        for hist_msg in conversation_payload(s, messages):
+            role = "scammer" if hist_msg["sender"] == "scammer" else "agent"
+            history.add(role, hist_msg["text"], str(hist_msg["timestamp"]))
+        data[s] = history
+    return data
+
+
+def report(label: str, sessions: int, dict_bytes: int, compact_bytes: int):
+    print(f"[{label}]")
+    print(f"  list of dicts:       {dict_bytes / 2**20:8.1f} MiB ({dict_bytes / sessions:7.0f} B/session)")
+    print(f"  ConversationHistory: {compact_bytes / 2**20:8.1f} MiB ({compact_bytes / sessions:7.0f} B/session)")
+    print(f"  Reduction:           {100 * (1 - compact_bytes / dict_bytes):8.1f}%")
+
+
+def measure(builder, sessions: int, messages: int):
+    tracemalloc.start()
+    data = builder(sessions, messages)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return current
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    print(f"Sessions: {sessions}, messages per session: {messages}")
+    report("logged", sessions,
+           measure(build_dict_sessions, sessions, messages),
+           measure(build_compact_sessions, sessions, messages))
+    report("rebuilt", sessions,
+           measure(build_rebuilt_dict_sessions, sessions, messages),
+           measure(build_rebuilt_compact_sessions, sessions, messages))
+
+
+if __name__ == "__main__":
+    main()
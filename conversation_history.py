@@ -0,0 +1,209 @@
+"""
+Compact Conversation History
+============================
+
+Columnar storage for per-session conversation history. Instead of one dict
+per message, each history keeps:
+
+- role codes in a byte array (role names are interned in a shared table)
+- timestamps in a 64-bit integer array (epoch microseconds for ISO strings,
+  the integer itself for epoch-millisecond strings), tagged by a kind byte
+- message text as UTF-8 in a single bytearray, addressed by offsets
+
+Entries are materialised as the original dicts ({"role", "message",
+"timestamp"}) only when read, so existing callers and the JSON log format
+are unchanged.
+"""
+
+from array import array
+from datetime import datetime, timedelta
+
+# Shared role table: codes are indexes into ROLE_NAMES
+ROLE_NAMES = ["scammer", "agent"]
+ROLE_CODES = {"scammer": 0, "agent": 1}
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+INT64_MIN = -(2 ** 63)
+INT64_MAX = 2 ** 63 - 1
+
+# Timestamp kinds: how the value in the timestamps array is rendered back
+TIMESTAMP_ISO = 0       # Epoch microseconds, rendered as naive ISO string
+TIMESTAMP_INTEGER = 1   # Integer string such as epoch milliseconds, stored as int
+TIMESTAMP_RAW = 2       # Kept verbatim in raw_timestamps
+
+
+def role_code(role: str) -> int:
+    """
+    Return the interned code for a role name, registering new roles.
+
+    Args:
+        role: Role name ('scammer', 'agent', ...)
+
+    Returns:
+        Integer role code
+    """
+    code = ROLE_CODES.get(role)
+    if code is None:
+        code = len(ROLE_NAMES)
+        ROLE_NAMES.append(role)
+        ROLE_CODES[role] = code
+    return code
+
+
+def encode_timestamp(timestamp: str):
+    """
+    Encode a timestamp string as (kind, int64) if it round-trips exactly.
+
+    Naive ISO timestamps become epoch microseconds and canonical integer
+    strings (e.g. epoch milliseconds from PS-2 conversationHistory) are
+    stored as their integer value.
+
+    Args:
+        timestamp: Timestamp string
+
+    Returns:
+        (kind, value) tuple, or None if the string must be stored verbatim
+    """
+    try:
+        number = int(timestamp)
+    except (TypeError, ValueError):
+        pass
+    else:
+        if str(number) == timestamp and INT64_MIN <= number <= INT64_MAX:
+            return TIMESTAMP_INTEGER, number
+        return None
+
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None or parsed.isoformat() != timestamp:
+        return None
+    return TIMESTAMP_ISO, (parsed - EPOCH) // ONE_MICROSECOND
+
+
+class ConversationHistory:
+    """
+    Compact, list-like container for a session's conversation messages.
+
+    Supports len(), iteration, indexing and slicing (yielding message dicts)
+    plus append() of message dicts, matching how the plain list was used.
+    """
+
+    __slots__ = ("roles", "timestamp_kinds", "timestamps", "raw_timestamps",
+                 "text", "offsets", "raw_messages")
+
+    def __init__(self, entries=None):
+        self.roles = array('B')
+        self.timestamp_kinds = array('B')
+        self.timestamps = array('q')
+        self.raw_timestamps = None  # {index: timestamp} for TIMESTAMP_RAW entries
+        self.text = bytearray()
+        self.offsets = array('I', [0])
+        self.raw_messages = None    # {index: message} for non-string messages
+        if entries:
+            for entry in entries:
+                self.append(entry)
+
+    def add(self, role: str, message, timestamp: str = None):
+        """
+        Append a message to the history.
+
+        Args:
+            role: Message sender role ('scammer' or 'agent')
+            message: The message content (non-string values are kept as-is)
+            timestamp: Timestamp string (defaults to current UTC time in ISO format)
+        """
+        index = len(self.roles)
+
+        if timestamp is None:
+            encoded = (TIMESTAMP_ISO, (datetime.utcnow() - EPOCH) // ONE_MICROSECOND)
+        else:
+            encoded = encode_timestamp(timestamp)
+        if encoded is None:
+            if self.raw_timestamps is None:
+                self.raw_timestamps = {}
+            self.raw_timestamps[index] = timestamp
+            encoded = (TIMESTAMP_RAW, 0)
+
+        if not isinstance(message, str):
+            if self.raw_messages is None:
+                self.raw_messages = {}
+            self.raw_messages[index] = message
+            message = ""
+
+        self.roles.append(role_code(role))
+        self.timestamp_kinds.append(encoded[0])
+        self.timestamps.append(encoded[1])
+        self.text += message.encode('utf-8')
+        self.offsets.append(len(self.text))
+
+    def append(self, entry: dict):
+        """Append a message dict with 'role', 'message' and 'timestamp' keys"""
+        self.add(entry["role"], entry["message"], entry.get("timestamp"))
+
+    def role(self, index: int) -> str:
+        """Return the role of the message at index"""
+        return ROLE_NAMES[self.roles[index]]
+
+    def message(self, index: int) -> str:
+        """Return the text of the message at index"""
+        if self.raw_messages is not None and index in self.raw_messages:
+            return self.raw_messages[index]
+        return self.text[self.offsets[index]:self.offsets[index + 1]].decode('utf-8')
+
+    def timestamp(self, index: int) -> str:
+        """Return the timestamp string of the message at index"""
+        kind = self.timestamp_kinds[index]
+        if kind == TIMESTAMP_ISO:
+            return (EPOCH + self.timestamps[index] * ONE_MICROSECOND).isoformat()
+        if kind == TIMESTAMP_INTEGER:
+            return str(self.timestamps[index])
+        return self.raw_timestamps[index]
+
+    def messages_by_role(self, role: str):
+        """
+        Return the text of all messages sent by a role, in order.
+
+        Args:
+            role: Role name to filter by
+
+        Returns:
+            List of message strings
+        """
+        code = ROLE_CODES.get(role)
+        return [self.message(i) for i, value in enumerate(self.roles) if value == code]
+
+    def entry(self, index: int) -> dict:
+        """Return the message at index in the log dict format"""
+        return {
+            "role": self.role(index),
+            "message": self.message(index),
+            "timestamp": self.timestamp(index)
+        }
+
+    def to_list(self):
+        """
+        Serialise the history to the conversation log format.
+
+        Returns:
+            List of {"role", "message", "timestamp"} dicts
+        """
+        return [self.entry(i) for i in range(len(self.roles))]
+
+    def __len__(self):
+        return len(self.roles)
+
+    def __iter__(self):
+        for i in range(len(self.roles)):
+            yield self.entry(i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.entry(i) for i in range(*index.indices(len(self.roles)))]
+        if index < 0:
+            index += len(self.roles)
+        if not 0 <= index < len(self.roles):
+            raise IndexError("history index out of range")
+        return self.entry(index)
@@ -10,16 +10,21 @@ Built for India AI Impact Buildathon 2026 - PS-2 Challenge
 """
 
 from fastapi import FastAPI, Request, HTTPException, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse
 import json
 import re
 import os
+import sys
 import random
 import asyncio
+import cProfile
+import contextvars
+import threading
 import requests
 from datetime import datetime
 import uvicorn
 from typing import Optional
+from conversation_history import ConversationHistory
 
 # Initialize FastAPI application
 app = FastAPI(
@@ -58,6 +63,15 @@ ip_session_mapping = {}     # Maps client IPs to session IDs for continuity
 request_timestamps = {}
 RATE_LIMIT_SECONDS = 2  # Minimum 2 seconds between requests
 
+# Request profiling configuration (no overhead unless PROFILE_ENABLED=true)
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of requests to profile
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "pstats")              # 'pstats' or 'collapsed'
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))       # Oldest profiles are rotated out
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.001"))  # Seconds between stack samples
+PROFILE_DEBUG_HEADER = "x-debug-profile"
+
 async def log_conversation(session_id: str, role: str, message: str):
     """
     Log conversation messages to JSON files organized by date.
@@ -73,15 +87,11 @@ async def log_conversation(session_id: str, role: str, message: str):
             conversation_sessions[session_id] = {
                 "session_id": session_id,
                 "started_at": datetime.utcnow().isoformat(),
-                "conversation_history": []
+                "conversation_history": ConversationHistory()
             }
         
         # Add message to conversation history
-        conversation_sessions[session_id]["conversation_history"].append({
-            "role": role,
-            "message": message,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        conversation_sessions[session_id]["conversation_history"].add(role, message)
         
         # Create date-based directory structure
         today = datetime.now().strftime("%Y-%m-%d")
@@ -96,7 +106,7 @@ async def log_conversation(session_id: str, role: str, message: str):
             "started_at": conversation_sessions[session_id]["started_at"],
             "last_updated": datetime.utcnow().isoformat(),
             "total_messages": len(conversation_sessions[session_id]["conversation_history"]),
-            "conversation_history": conversation_sessions[session_id]["conversation_history"]
+            "conversation_history": conversation_sessions[session_id]["conversation_history"].to_list()
         }
         
         with open(log_file, 'w', encoding='utf-8') as f:
@@ -113,11 +123,11 @@ def get_conversation_history(session_id: str):
         session_id: Session identifier
         
     Returns:
-        List of conversation messages or empty list
+        ConversationHistory of messages (empty if session is unknown)
     """
     if session_id in conversation_sessions:
         return conversation_sessions[session_id]["conversation_history"]
-    return []
+    return ConversationHistory()
 
 def get_or_create_session_for_ip(client_ip: str, provided_session_id: str = None):
     """
@@ -183,8 +193,8 @@ def generate_agent_response(message: str, is_scam: bool, session_id: str, stage:
     message_count = len(history)
     
     # Extract previous messages for context analysis
-    previous_messages = [msg["message"] for msg in history if msg["role"] == "scammer"]
-    previous_agent_responses = [msg["message"] for msg in history if msg["role"] == "agent"]
+    previous_messages = history.messages_by_role("scammer")
+    previous_agent_responses = history.messages_by_role("agent")
     
     # Analyze all conversation text for intelligence extraction
     all_text = " ".join(previous_messages + [message])
@@ -387,10 +397,269 @@ async def send_guvi_callback(session_id: str, scam_detected: bool, total_message
         print(f"GUVI CALLBACK ERROR: {e}")
         return False
 
+# Profiling state: one profile at a time, background tasks tracked per request
+profile_in_progress = False
+profile_finisher = None     # Keeps the pending profile completion task alive
+profile_tasks = contextvars.ContextVar("profile_tasks", default=None)
+
+def spawn_background(coro):
+    """
+    Schedule a background task, tracking it when the current request is profiled.
+
+    Args:
+        coro: Coroutine to run in the background
+
+    Returns:
+        The created asyncio task
+    """
+    task = asyncio.create_task(coro)
+    tasks = profile_tasks.get()
+    if tasks is not None:
+        tasks.append(task)
+    return task
+
+class StackSampler:
+    """
+    Samples the Python stack of one thread at a fixed interval and
+    aggregates the samples as collapsed stacks for flamegraph tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        # Sample immediately, then once per interval until stopped
+        while True:
+            self._sample()
+            if self._stop_event.wait(self.interval):
+                break
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if names:
+            stack = ";".join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def dump(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+def list_profile_files():
+    """
+    List saved profile files, newest first.
+
+    Returns:
+        List of profile file names in PROFILE_DIR
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = [name for name in os.listdir(PROFILE_DIR) if name.startswith("profile_")]
+    return sorted(names, reverse=True)
+
+def save_profile(profiler, session_label: str):
+    """
+    Write a finished profile to PROFILE_DIR and rotate out old files.
+    Sampled profiles without any samples are not written.
+
+    Args:
+        profiler: cProfile.Profile or StackSampler instance
+        session_label: Short label included in the file name
+    """
+    try:
+        if isinstance(profiler, StackSampler) and not profiler.stacks:
+            return
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        label = re.sub(r'[^a-zA-Z0-9_-]', '-', session_label)[:40]
+
+        if isinstance(profiler, StackSampler):
+            profiler.dump(f"{PROFILE_DIR}/profile_{stamp}_{label}.collapsed")
+        else:
+            profiler.dump_stats(f"{PROFILE_DIR}/profile_{stamp}_{label}.prof")
+
+        # Keep only the newest PROFILE_MAX_FILES profiles
+        for old_name in list_profile_files()[PROFILE_MAX_FILES:]:
+            os.remove(f"{PROFILE_DIR}/{old_name}")
+
+    except Exception as e:
+        print(f"Profiling error: {e}")
+
+def should_profile(request: Request, x_api_key: Optional[str]):
+    """
+    Decide whether this request should be profiled.
+
+    A request is profiled when it carries the debug header together with the
+    configured X_API_KEY, or when it falls within PROFILE_SAMPLE_RATE.
+
+    Args:
+        request: FastAPI request object
+        x_api_key: API key from request headers
+
+    Returns:
+        Boolean indicating whether to profile
+    """
+    if profile_in_progress:
+        return False
+
+    if request.headers.get(PROFILE_DEBUG_HEADER):
+        expected_api_key = os.getenv("X_API_KEY")
+        if expected_api_key and x_api_key == expected_api_key:
+            return True
+
+    return random.random() < PROFILE_SAMPLE_RATE
+
+def stop_profiler(profiler):
+    """Stop a cProfile.Profile or StackSampler instance"""
+    if isinstance(profiler, StackSampler):
+        profiler.stop()
+    else:
+        profiler.disable()
+
+async def finish_profile(profiler, tasks: list, session_label: str):
+    """
+    Wait for a profiled request's background tasks, then stop and save the profile.
+
+    Args:
+        profiler: cProfile.Profile or StackSampler instance
+        tasks: Background tasks spawned by the profiled request
+        session_label: Short label included in the file name
+    """
+    global profile_in_progress
+    try:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        stop_profiler(profiler)
+        profile_in_progress = False
+    save_profile(profiler, session_label)
+
+async def run_profiled(request: Request, path: str, x_api_key: Optional[str]):
+    """
+    Run the request handler under the configured profiler.
+
+    The response is returned immediately. Background tasks spawned by the
+    request (logging, GUVI callback) keep the profiler running until they
+    finish, and the profile is saved from a completion task.
+
+    Both profilers observe the whole event-loop thread, so other requests
+    handled while a profile is running also appear in it.
+
+    Args:
+        request: FastAPI request object
+        path: URL path
+        x_api_key: Optional API key
+
+    Returns:
+        Response from handle_request
+    """
+    global profile_in_progress, profile_finisher
+    profile_in_progress = True
+    tasks = []
+    token = profile_tasks.set(tasks)
+
+    if PROFILE_FORMAT == "collapsed":
+        profiler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        response = await handle_request(request, path, x_api_key)
+    except BaseException:
+        stop_profiler(profiler)
+        profile_in_progress = False
+        raise
+    finally:
+        profile_tasks.reset(token)
+
+    if tasks:
+        profile_finisher = asyncio.create_task(finish_profile(profiler, tasks, path or "root"))
+    else:
+        stop_profiler(profiler)
+        profile_in_progress = False
+        save_profile(profiler, path or "root")
+    return response
+
+def require_admin_key(x_api_key: Optional[str]):
+    """
+    Guard admin endpoints: X_API_KEY must be configured and match.
+
+    Args:
+        x_api_key: API key from request headers
+    """
+    expected_api_key = os.getenv("X_API_KEY")
+    if not expected_api_key or x_api_key != expected_api_key:
+        raise HTTPException(status_code=403, detail="Invalid API key")
+
+async def list_profiles(x_api_key: Optional[str] = Header(None)):
+    """List recent request profiles"""
+    require_admin_key(x_api_key)
+
+    profiles = []
+    for name in list_profile_files():
+        stat = os.stat(f"{PROFILE_DIR}/{name}")
+        profiles.append({
+            "name": name,
+            "size_bytes": stat.st_size,
+            "created_at": datetime.utcfromtimestamp(stat.st_mtime).isoformat()
+        })
+    return {"profiles": profiles}
+
+async def get_profile(name: str, x_api_key: Optional[str] = Header(None)):
+    """Download a single request profile"""
+    require_admin_key(x_api_key)
+
+    # Only serve files that are actually in the profile directory
+    if name not in list_profile_files():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(f"{PROFILE_DIR}/{name}", filename=name)
+
+# Admin routes exist only when profiling is enabled (registered before the catch-all)
+if PROFILE_ENABLED:
+    app.add_api_route("/admin/profiles", list_profiles, methods=["GET"])
+    app.add_api_route("/admin/profiles/{name}", get_profile, methods=["GET"])
+
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
 async def catch_all(request: Request, path: str = "", x_api_key: Optional[str] = Header(None)):
     """
     Universal API endpoint that handles all requests and paths.
+
+    Requests are optionally profiled (see PROFILE_* settings) before being
+    passed to handle_request.
+
+    Args:
+        request: FastAPI request object
+        path: URL path (ignored, all paths accepted)
+        x_api_key: Optional API key for authentication
+
+    Returns:
+        PS-2 compliant JSON response
+    """
+    if PROFILE_ENABLED and should_profile(request, x_api_key):
+        return await run_profiled(request, path, x_api_key)
+    return await handle_request(request, path, x_api_key)
+
+async def handle_request(request: Request, path: str = "", x_api_key: Optional[str] = None):
+    """
+    Process a single honeypot request.
     Designed to be bulletproof and never return validation errors.
     
     This endpoint:
@@ -527,7 +796,7 @@ async def catch_all(request: Request, path: str = "", x_api_key: Optional[str] =
         if conversation_history:
             # Reset session history to rebuild from provided history
             if actual_session_id in conversation_sessions:
-                conversation_sessions[actual_session_id]["conversation_history"] = []
+                conversation_sessions[actual_session_id]["conversation_history"] = ConversationHistory()
             
             # Process each historical message
             for hist_msg in conversation_history:
@@ -544,15 +813,13 @@ async def catch_all(request: Request, path: str = "", x_api_key: Optional[str] =
                             conversation_sessions[actual_session_id] = {
                                 "session_id": actual_session_id,
                                 "started_at": datetime.utcnow().isoformat(),
-                                "conversation_history": []
+                                "conversation_history": ConversationHistory()
                             }
                         
                         # Add historical message to session
-                        conversation_sessions[actual_session_id]["conversation_history"].append({
-                            "role": role,
-                            "message": hist_text,
-                            "timestamp": str(hist_timestamp)
-                        })
+                        conversation_sessions[actual_session_id]["conversation_history"].add(
+                            role, hist_text, str(hist_timestamp)
+                        )
         
         # Scam detection algorithm
         scam_words = ['winner', 'prize', 'lottery', 'suspended', 'blocked', 'verify', 'urgent', 'transfer', 'account', 'bank', 'upi', 'payment', 'fee', 'money', 'otp', 'verify', 'immediately', 'expire']
@@ -570,7 +837,7 @@ async def catch_all(request: Request, path: str = "", x_api_key: Optional[str] =
         is_scam = confidence > 0.15 or matches >= 2
         
         # Log scammer message
-        asyncio.create_task(log_conversation(actual_session_id, "scammer", message))
+        spawn_background(log_conversation(actual_session_id, "scammer", message))
         
         # Generate agent response if scam detected
         agent_reply = None
@@ -578,7 +845,7 @@ async def catch_all(request: Request, path: str = "", x_api_key: Optional[str] =
             agent_reply = generate_agent_response(message, is_scam, actual_session_id)
             if agent_reply:
                 # Log agent response
-                asyncio.create_task(log_conversation(actual_session_id, "agent", agent_reply))
+                spawn_background(log_conversation(actual_session_id, "agent", agent_reply))
         
         # Extract intelligence from current message
         bank_accounts = list(set(re.findall(r'\b\d{9,18}\b', message)))
@@ -609,7 +876,7 @@ async def catch_all(request: Request, path: str = "", x_api_key: Optional[str] =
                 agent_notes = f"Conversation terminated after {total_messages} turns to prevent infinite loop. Intelligence extracted successfully."
                 
                 # Send GUVI callback
-                asyncio.create_task(send_guvi_callback(
+                spawn_background(send_guvi_callback(
                     actual_session_id,
                     True,  # scam_detected
                     total_messages,
@@ -641,7 +908,7 @@ async def catch_all(request: Request, path: str = "", x_api_key: Optional[str] =
             agent_notes += "Scammer used urgency tactics and payment redirection."
             
             # Send callback asynchronously
-            asyncio.create_task(send_guvi_callback(
+            spawn_background(send_guvi_callback(
                 actual_session_id, is_scam, total_messages, 
                 extracted_intelligence, agent_notes
             ))